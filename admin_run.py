@@ -1,24 +1,71 @@
-import math
-from simulation import Simulation
-from maker import SimpleMarketMaker as MarketMaker
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import numpy as np
+from simulation import Simulation, BatchSimulation
+from maker import SimpleMarketMaker as MarketMaker, BatchMarketMaker
 
 DURATION = 10
+# Give up instead of rerunning forever when a strategy keeps ending with a NaN profit
+MAX_ATTEMPTS = 10 * DURATION
 
-def admin_run(logging=False):
+def _run_once(game: int) -> float:
+    """
+    Run a single game with a fresh market maker. Top-level so it can be pickled by worker processes.
+
+    Games aren't reproducible: seeding numpy only covers the simulation's own randomness, MarketData
+    seeds its prices from the clock, so games started in the same second can share a price stream.
+    """
+    np.random.seed(game)
+    mm = MarketMaker()
+    sim = Simulation(mm)
+    sim.run(logging=False, fast=False)
+    return sim.get_final_profit()
+
+def _run_batch(n: int) -> np.ndarray:
+    # Every trajectory is a column of the batch, so all n runs advance together
+    mm = BatchMarketMaker(N=n)
+    sim = BatchSimulation(mm)
+    sim.run(fast=False)
+    return sim.get_final_profit()
+
+def admin_run(logging=False, workers=None, batch=False):
     sum_profit = 0
-    i = 0
-    while(i < DURATION):
-        mm = MarketMaker()
-        sim = Simulation(mm)
-        sim.run(logging=False, fast=False)
-        profit = sim.get_final_profit()
-        if logging:
-            print(profit, math.isnan(profit))
-        if math.isnan(profit):
-            continue
-        sum_profit += profit
-        i += 1
+    valid = 0
+    attempts = 0
+
+    # Games that end with a NaN profit are rerun until DURATION of them are valid
+    with (nullcontext() if batch else ProcessPoolExecutor(max_workers=workers)) as ex:
+        while valid < DURATION:
+            if attempts >= MAX_ATTEMPTS:
+                raise RuntimeError(f"Only {valid} of {DURATION} games had a valid profit after {attempts} games")
 
+            needed = DURATION - valid
+            if batch:
+                profits = _run_batch(needed)
+            else:
+                # Each game runs in its own worker process
+                profits = np.array(list(ex.map(_run_once, range(attempts, attempts + needed))))
+            attempts += needed
+
+            for profit in profits:
+                if logging:
+                    print(profit, np.isnan(profit))
+                if not np.isnan(profit):
+                    sum_profit += profit
+                    valid += 1
+
+    if attempts > DURATION:
+        print(f"Reran {attempts - DURATION} games that ended with a NaN profit")
     print(f"Average profit: {sum_profit/DURATION}")
 
-admin_run()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (defaults to os.cpu_count())")
+    parser.add_argument("--batch", action="store_true",
+                        help="run the vectorized BatchMarketMaker instead of MarketMaker")
+    parser.add_argument("--logging", action="store_true", help="print the profit of every run")
+    args = parser.parse_args()
+
+    admin_run(logging=args.logging, workers=args.workers, batch=args.batch)
\ No newline at end of file
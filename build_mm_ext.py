@@ -0,0 +1,20 @@
+"""
+Ahead-of-time compile the numba kernels in maker.py into the mm_native extension module, so
+processes don't have to JIT them on their first call. Meant for benchmarking runs:
+
+    python build_mm_ext.py
+    MM_NATIVE=1 python admin_run.py
+
+maker.py only uses mm_native when MM_NATIVE=1 is set, and the JIT versions otherwise. The module is
+a snapshot of the kernels at build time, rebuild it after changing them. numba.pycc is pending
+deprecation in numba, so this may stop working with future releases.
+"""
+from numba.pycc import CC
+from maker import _simulate_gbm
+
+cc = CC('mm_native')
+
+cc.export('simulate_gbm', 'UniTuple(f8, 2)(f8[::1], f8[:, ::1])')(_simulate_gbm.py_func)
+
+if __name__ == "__main__":
+    cc.compile()
@@ -1,7 +1,8 @@
 from simulation import Simulation
 from maker import SimpleMarketMaker, MarketMaker, OrderType
 from typing import List, Tuple, Literal
-from abc import ABCMeta
+import functools
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
@@ -10,16 +11,47 @@ from time import time
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+sns.set_theme(style="whitegrid")
+
+default_cols = ["Market Bid Price", "Market Ask Price", "Holding", "Money", "Timestamp", 
+                "Bid Price", "Bid Vol", "Ask Price", "Ask Vol"]
+
+def _fast_to_csv(path, arr: np.ndarray, cols: List[str], float_format: str = '%.12g'):
+    """
+    Write an all-numeric 2D array as CSV with one %-format over the flattened data and a single write,
+    instead of going through pandas' per-row formatter. Only safe for numeric data, nothing is quoted.
+    """
+    header = ','.join(cols) + '\n'
+    fmt = ','.join([float_format] * arr.shape[1]) + '\n'
+    body = (fmt * arr.shape[0]) % tuple(arr.ravel().tolist())
+    with open(path, 'w') as f:
+        f.write(header + body)
+
 class DataTracker:
-    def __init__(self, save_csv: str = None):
+    def __init__(self, save_csv: str = None, capacity: int = 1024, save_path: str = None, fast: bool = False):
+        # save_csv is kept for older callers, the format is picked from the save_path extension
         self.save_csv = save_csv
-        self.information = []
+        self.save_path = save_path or save_csv
+        # Write plain CSVs with _fast_to_csv, only valid when every tracked value is numeric
+        self.fast = fast
+        # One array per column, written in place; they all double in size whenever they fill up
+        self._cols = [np.empty(capacity, dtype=np.int64 if col == 'Timestamp' else np.float64)
+                      for col in default_cols]
+        self._n = 0
         
         self.more_info = []
         self.column_names = None
         
-    def update(self, *args):
-        self.information.append([*args])
+    def update(self, row):
+        """
+        Add one row, a length-9 tuple or array ordered like default_cols
+        """
+        if self._n == len(self._cols[0]):
+            # max(1, ...) so a tracker created with capacity=0 can still grow
+            self._cols = [np.concatenate((col, np.empty(max(1, len(col)), dtype=col.dtype))) for col in self._cols]
+        for col, value in zip(self._cols, row):
+            col[self._n] = value
+        self._n += 1
         
     def config_info(self, column_names: str): 
         self.column_names = column_names
@@ -28,9 +60,7 @@ class DataTracker:
         self.more_info.append([*args])
 
     def close(self): 
-        default_cols = ["Market Bid Price", "Market Ask Price", "Holding", "Money", "Timestamp", 
-                        "Bid Price", "Bid Vol", "Ask Price", "Ask Vol"]
-        data = pd.DataFrame(self.information, columns = default_cols)
+        data = pd.DataFrame({name: col[:self._n] for name, col in zip(default_cols, self._cols)})
 
         if self.more_info: 
             data2 = pd.DataFrame(self.more_info, columns = self.column_names)
@@ -38,50 +68,78 @@ class DataTracker:
         
         data.set_index('Timestamp', inplace=True)
         
-        if self.save_csv: 
-            data.to_csv(self.save_csv)
+        if self.save_path: 
+            self.save(data, self.save_path)
 
         return data
-    
-# A metaclass intended to automatically log data provided 
-class DataMarketMakerMeta(ABCMeta):
-    
-     def __new__(cls, name, bases, dct):
-            
-        dct['tracker'] = DataTracker()
 
-        update_method = dct.get("update") or any(hasattr(base, "update") for base in bases)
-        
-        if not update_method: 
-            raise ValueError("MarketMaker ")
-            
-        def tracking_update(self, *args):
-            info = [*args]
-            actions = list(update_method(self, *args))
-            self.tracker.update(*(info + actions[:-1])) # Get rid of the limit order from tracking
-            return tuple(actions)
-        
-        dct['update'] = tracking_update
-        
-        def close(self):
-            return self.tracker.close()
-        
-        dct['close'] = close
-        
-        return super().__new__(cls, name, bases, dct)
+    def save(self, data: pd.DataFrame, path: str):
+        """
+        Write the tracked data to path. .feather and .parquet go through pyarrow, which is much faster
+        and smaller than CSV; anything else is written as CSV, gzipped at the fastest level for .gz.
+        """
+        path = Path(path)
+        if path.suffix == '.feather':
+            data.reset_index().to_feather(path) # Feather only stores a default index
+        elif path.suffix == '.parquet':
+            data.to_parquet(path, engine='pyarrow', compression='zstd')
+        elif path.suffix == '.gz':
+            data.to_csv(path, compression={'method': 'gzip', 'compresslevel': 1})
+        elif self.fast:
+            data = data.reset_index()
+            _fast_to_csv(path, data.to_numpy(dtype=np.float64), list(data.columns))
+        else:
+            data.to_csv(path)
     
-class DataMarketMaker(MarketMaker, metaclass = DataMarketMakerMeta):
-    pass
+# A class decorator to automatically log the data passed to and returned by update
+def track_updates(cls):
+    update_method = cls.update
+
+    @functools.wraps(update_method)
+    def tracking_update(self, *args):
+        actions = update_method(self, *args)
+        self.tracker.update((*args, *actions[:-1])) # Get rid of the limit order from tracking
+        return actions
+
+    cls.update = tracking_update
+    return cls
+
+class DataMarketMaker(MarketMaker):
+    """
+    Inherit from this instead of MarketMaker to have every update tracked. Each subclass that
+    defines update gets it wrapped by track_updates, and each instance gets its own DataTracker.
+    """
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'update' in cls.__dict__:
+            track_updates(cls)
+
+    @property
+    def tracker(self) -> DataTracker:
+        # Created on first use, so subclasses don't need to call super().__init__()
+        if '_tracker' not in self.__dict__:
+            self._tracker = DataTracker()
+        return self._tracker
+
+    @tracker.setter
+    def tracker(self, tracker: DataTracker):
+        # e.g. self.tracker = DataTracker(save_path="run.parquet") in a subclass __init__
+        self._tracker = tracker
+
+    def close(self):
+        return self.tracker.close()
 
 def plot_defaults(data, additional_cols: List = None):
     df = data.reset_index()
-    df['Market Spread'] = (df['Market Ask Price'] - df['Market Bid Price']).rolling(window=100).mean()
-    df['Market Price'] = ((df['Market Ask Price'] + df['Market Bid Price']) / 2).rolling(window=10).mean()
 
-    df['Agent Spread'] = (df['Ask Price'] - df['Bid Price']).rolling(window=100).mean()
-    df['Agent Price'] = ((df['Ask Price'] + df['Bid Price']) / 2).rolling(window=10).mean()
+    market_bid, market_ask = df['Market Bid Price'].to_numpy(), df['Market Ask Price'].to_numpy()
+    agent_bid, agent_ask = df['Bid Price'].to_numpy(), df['Ask Price'].to_numpy()
+
+    df['Market Spread'] = pd.Series(market_ask - market_bid).rolling(window=100).mean().to_numpy()
+    df['Market Price'] = pd.Series((market_ask + market_bid) * 0.5).rolling(window=10).mean().to_numpy()
 
-    sns.set(style="whitegrid")
+    df['Agent Spread'] = pd.Series(agent_ask - agent_bid).rolling(window=100).mean().to_numpy()
+    df['Agent Price'] = pd.Series((agent_ask + agent_bid) * 0.5).rolling(window=10).mean().to_numpy()
 
     columns_to_plot = ['Market Price', 'Agent Price', 'Market Spread', 'Agent Spread',
                        'Holding', 'Money', 'Bid Vol', 'Ask Vol']
@@ -93,13 +151,17 @@ def plot_defaults(data, additional_cols: List = None):
     
 def plot(df, columns_to_plot: List): 
     
-    fig, axes = plt.subplots(len(columns_to_plot), 1, figsize=(10, 2 * len(columns_to_plot)))
+    fig, axes = plt.subplots(len(columns_to_plot), 1, figsize=(10, 2 * len(columns_to_plot)),
+                             sharex=True, squeeze=False)
+
+    # Plain ax.plot, sns.lineplot would bootstrap a confidence interval for every subplot
+    ts = df['Timestamp'].to_numpy() if 'Timestamp' in df.columns else df.index.to_numpy()
 
-    for ax, column in zip(axes, columns_to_plot):
-        sns.lineplot(data=df, x='Timestamp', y=column, ax=ax)
+    for ax, column in zip(axes[:, 0], columns_to_plot):
+        ax.plot(ts, df[column].to_numpy(), linewidth=1)
         ax.set_title(f'{column} over Time')
-        ax.set_xlabel('Timestamp')
         ax.set_ylabel(column)
+    axes[-1, 0].set_xlabel('Timestamp')
 
     plt.tight_layout()
     plt.show() 
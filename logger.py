@@ -1,27 +1,50 @@
+import weakref
+
 class Logger:
-    def __init__(self, log_file):
+    _ERROR = b'[ERROR]:   '
+    _WARNING = b'[WARNING]: '
+    _INFO = b'[INFO]:    '
+
+    def __init__(self, log_file, buffer_size=1 << 16):
         self.log_file = log_file
+        self.buffer_size = buffer_size
         self.f = None
 
-    def log(self, message):
+    def _write(self, prefix, message):
+        # Opened lazily in binary mode with a large buffer, so each message isn't its own syscall
         if self.f is None:
-            self.f = open(self.log_file, 'a')
-        self.f.write(message + '\n')
+            self.f = open(self.log_file, 'ab', buffering=self.buffer_size)
+            # Closes (and so flushes) the file when the logger is collected or at exit, without
+            # keeping the logger itself alive
+            self._finalizer = weakref.finalize(self, self.f.close)
+        self.f.write(prefix + message.encode() + b'\n')
+
+    def log(self, message):
+        self._write(b'', message)
 
     def error(self, message):
-        self.log(f'[ERROR]:   {message}')
+        self._write(self._ERROR, message)
 
     def warning(self, message):
-        self.log(f'[WARNING]: {message}')
+        self._write(self._WARNING, message)
 
     def info(self, message):
-        self.log(f'[INFO]:    {message}')
+        self._write(self._INFO, message)
 
     def spacing(self):
         self.log('')
         self.log('------------------------------------------------------------')
         self.log('')
 
+    def flush(self):
+        if self.f is not None:
+            self.f.flush()
+
+    def close(self):
+        if self.f is not None:
+            self._finalizer()
+            self.f = None
+
 # [LOG]:     |
 # [ERROR]:   |
 # [WARNING]: |
\ No newline at end of file
@@ -1,16 +1,16 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
 from typing import Tuple, Literal
+from numba import njit
+import math
+import os
 import numpy as np
 
-@dataclass
 class OrderType:
     """
-    Data class to represent the order type, which can be either "limit" or "market"
+    Class to represent the order type, which can be either "limit" or "market".
+    Uses __slots__ so instances carry no per-instance dict, and can be reused across intervals.
     """
-    type: Literal["limit", "market"]
-    from_time: int
-    to_time: int
+    __slots__ = ('type', 'from_time', 'to_time')
 
     def __init__ (self, type: Literal["limit", "market"], from_time: int, to_time: int):
         self.type = type
@@ -19,6 +19,8 @@ class OrderType:
 
     def __str__(self):
         return f"OrderType(type={self.type}, from_time={self.from_time}, to_time={self.to_time})"
+
+    __repr__ = __str__
     
     def new_limit_order(from_time: int, to_time: int):
         """
@@ -75,26 +77,54 @@ class SimpleMarketMaker(MarketMaker):
         """
         An example on how to implement a market maker.
         """
-        def __init__(self):
-            self.prev_bid_history = []
-            self.prev_ask_history = []
-            
+        _FILL_TARGET = 0.75
+        _SPREAD_STEP = 0.005
+        _SPREAD_LO = 0.1
+        _SPREAD_HI = 0.9
+
+        def __init__(self, fast=False):
             """
-            Stats for our previous bid/asks orders:
-            For amount bought/sold calculations
+            :param fast: opt-in for benchmarking this example body only. Skips the GBM simulation and
+            never writes bid_ring, ask_ring and log_mid_ring, so a strategy that calls simulate() or
+            reads those rings must not be run with it.
             """
-            self.prev_mm_bid_price_history = []
-            self.prev_mm_ask_price_history = []
-            self.prev_mm_bid_amt_history = []
-            self.prev_mm_ask_amt_history = []
-            self.prev_holding_history = []
-            self.prev_money_history = []
-            
+            self.fast = fast
             self.spread_pct = 0.5
 
             self.window = 10
             self.simulations = 10
             self.sim_horizon = 3
+
+            """
+            The order returned by update, mutated in place every interval instead of reallocated.
+            The simulation copies the times out right away, so sharing one object is safe.
+            """
+            self._order = OrderType("limit", 0, 0)
+
+            self._rng = np.random.default_rng()
+
+            """
+            All histories are ring buffers of the last self.window intervals, written in lockstep.
+            self.head is the slot the next interval goes to, self.filled how many slots hold data.
+            """
+            self.head = 0
+            self.filled = 0
+
+            self.bid_ring = np.empty(self.window, dtype=np.float64)
+            self.ask_ring = np.empty(self.window, dtype=np.float64)
+            # log of the mid price, taken once per interval instead of over the whole window in simulate
+            self.log_mid_ring = np.empty(self.window, dtype=np.float64)
+            
+            """
+            Stats for our previous bid/asks orders:
+            For amount bought/sold calculations
+            """
+            self.mm_bid_price_ring = np.empty(self.window, dtype=np.float64)
+            self.mm_ask_price_ring = np.empty(self.window, dtype=np.float64)
+            self.mm_bid_amt_ring = np.empty(self.window, dtype=np.float64)
+            self.mm_ask_amt_ring = np.empty(self.window, dtype=np.float64)
+            self.holding_ring = np.empty(self.window, dtype=np.float64)
+            self.money_ring = np.empty(self.window, dtype=np.float64)
                       
         """
         Example on how to implement the update method for the market maker.
@@ -123,16 +153,26 @@ class SimpleMarketMaker(MarketMaker):
         """
         def update(self, prev_bid_price, prev_ask_price, holding, money, timestamp) -> Tuple[float, int, float, int, OrderType]:
              
-            self.prev_bid_history.append(prev_bid_price)
-            self.prev_ask_history.append(prev_ask_price)
-            self.prev_money_history.append(money)
-            self.prev_holding_history.append(holding)
+            cur = self.head
+            prev = (cur - 1) % self.window
+
+            if not self.fast:
+                self.bid_ring[cur] = prev_bid_price
+                self.ask_ring[cur] = prev_ask_price
+                mid = (prev_bid_price + prev_ask_price) / 2
+                # The engine can produce mid prices <= 0, which take the window to NaN like np.log would
+                self.log_mid_ring[cur] = math.log(mid) if mid > 0 else math.nan
+            self.money_ring[cur] = money
+            self.holding_ring[cur] = holding
+
+            self.head = (self.head + 1) % self.window
+            self.filled = min(self.filled + 1, self.window)
             
             """
             Calculate amount bought and sold in last round
             """
 
-            if len(self.prev_bid_history) <= 1:
+            if self.filled <= 1:
                 """
                 no prev amt history
                 
@@ -143,96 +183,235 @@ class SimpleMarketMaker(MarketMaker):
                 p_diff = prev_ask_price - prev_bid_price
                 cur_bid = prev_bid_price + p_diff/4
                 cur_ask = prev_ask_price - p_diff/4
+                bid_vol = self._bid_volume(money, cur_bid)
                 
-                prev_mm_bid_price_history.append(cur_bid)
-                prev_mm_ask_price_history.append(cur_ask)
+                self.mm_bid_price_ring[cur] = cur_bid
+                self.mm_ask_price_ring[cur] = cur_ask
 
-                prev_mm_bid_amt_history.append(((money//cur_bid)//2))
-                prev_mm_ask_amt_history.append(0)
+                self.mm_bid_amt_ring[cur] = bid_vol
+                self.mm_ask_amt_ring[cur] = 0
                 
                 """trying to do it on a quicker limit order time scale
                 same amount scale for now"""
-                return cur_bid, ((money//cur_bid)//2),cur_ask, 0,OrderType.new_limit_order(timestamp, timestamp + 1)
+                return cur_bid, bid_vol,cur_ask, 0,self._limit_order(timestamp, timestamp + 1)
                                    
-            diff_money = money - self.prev_money_history[len(self.prev_money_history)-1]
-            diff_hold = holding - self.holding_history[len(self.prev_holding_history)-1]
-            mm_prev_bid_price = self.prev_mm_bid_price_history[len(self.prev_mm_bid_price_history) - 1]
-            mm_prev_ask_price = self.prev_mm_ask_price_history[len(self.prev_mm_ask_price_history) - 1]
+            diff_money = money - self.money_ring[prev]
+            diff_hold = holding - self.holding_ring[prev]
+            mm_prev_bid_price = self.mm_bid_price_ring[prev]
+            mm_prev_ask_price = self.mm_ask_price_ring[prev]
 
-            prev_bid_amt = self.prev_mm_bid_amt_history[self.prev_mm_bid_amt_history.len -1]
-            prev_ask_amt = self.prev_mm_ask_amt_history[self.prev_mm_ask_amt_history.len -1]
+            prev_bid_amt = self.mm_bid_amt_ring[prev]
+            prev_ask_amt = self.mm_ask_amt_ring[prev]
             
-            prev_bid_filled = (diff_money - mm_prev_ask_price * diff_hold) / (prev_ask_price - prev_bid_price)
-            prev_ask_filled = (diff_money - mm_prev_bid_price * diff_hold) / (prev_ask_price - prev_bid_price)
-
             """
-            implementing new semi-naive strategy, where we go self.spread_pct out from the mean price
-
-            we adjust this self.spread_pct based on how much orders got filled
-            We are targeting getting around 75% of our orders being filled
-
-            There's more math to this in Grossman-Miller, we can figure that out
+            Nothing quoted last round (zero amounts) or a zero market spread gives inf/NaN here,
+            same as BatchMarketMaker; a NaN ratio widens the spread below
             """
-            if ((prev_bid_filled/prev_bid_amt) + (prev_ask_filled/prev_ask_amt))/2 > 0.75:
-                """
-                reduce spread_pct
-                """
-                self.spread_pct-= 0.005
-                """
-                artificial cap on max spread down
-                """
-                self.spread_pct = min(self.spread_pct, 0.9)
-            else:
-                """
-                increase spread_pct
-                """
-                self.spread_pct += 0.005
-                """
-                artificial cap on max spread down
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                prev_bid_filled = (diff_money - mm_prev_ask_price * diff_hold) / (prev_ask_price - prev_bid_price)
+                prev_ask_filled = (diff_money - mm_prev_bid_price * diff_hold) / (prev_ask_price - prev_bid_price)
+
                 """
-                self.spread_pct = max(self.spread_pct, 0.1)
+                implementing new semi-naive strategy, where we go self.spread_pct out from the mean price
 
+                we adjust this self.spread_pct based on how much orders got filled
+                We are targeting getting around 75% of our orders being filled
+
+                There's more math to this in Grossman-Miller, we can figure that out
+                """
+                fill_ratio = ((prev_bid_filled/prev_bid_amt) + (prev_ask_filled/prev_ask_amt))/2
 
-            mean, std = self.simulate()
-            
-            buy_dev = std * -0.1
-            sell_dev = std * 0.1
-            
-            max_buy_price = prev_bid_price + buy_dev
-            max_sell_price = prev_ask_price + sell_dev
-            
-            """return max_buy_price, int(money/max_buy_price - 1) // 2, max_sell_price, holding//2, OrderType.new_limit_order(timestamp, timestamp + 1)
             """
+            reduce spread_pct when over the target, increase it otherwise (also when the ratio is NaN),
+            without branching, then apply the artificial caps on both sides
+            """
+            delta = self._SPREAD_STEP * (1 - 2 * (fill_ratio > self._FILL_TARGET))
+            self.spread_pct = min(self._SPREAD_HI, max(self._SPREAD_LO, self.spread_pct + delta))
+
+
+            if not self.fast:
+                mean, std = self.simulate()
+                
+                buy_dev = std * -0.1
+                sell_dev = std * 0.1
+                
+                max_buy_price = prev_bid_price + buy_dev
+                max_sell_price = prev_ask_price + sell_dev
+                
+                """return max_buy_price, int(money/max_buy_price - 1) // 2, max_sell_price, holding//2, OrderType.new_limit_order(timestamp, timestamp + 1)
+                """
 
             diff_p = (prev_ask_price - prev_bid_price) * self.spread_pct
             midpoint = (prev_ask_price + prev_bid_price) / 2
 
             cur_bid = midpoint - diff_p
             cur_ask = midpoint + diff_p
+            bid_vol = self._bid_volume(money, cur_bid)
+
+            self.mm_bid_price_ring[cur] = cur_bid
+            self.mm_ask_price_ring[cur] = cur_ask
 
-            prev_mm_bid_price_history.append(cur_bid)
-            prev_mm_ask_price_history.append(cur_ask)
+            ask_vol = holding//2
 
-            prev_mm_bid_amt_history.append(((money//cur_bid)//2))
-            prev_mm_ask_amt_history.append(holdings//2)
+            self.mm_bid_amt_ring[cur] = bid_vol
+            self.mm_ask_amt_ring[cur] = ask_vol
 
-            return cur_bid, ((money//cur_bid)//2), cur_ask, holdings//2, OrderType.new_limit_order(timestamp, timestamp + 1)
+            return cur_bid, bid_vol, cur_ask, ask_vol, self._limit_order(timestamp, timestamp + 1)
+
+        def _bid_volume(self, money, cur_bid) -> int:
+            """
+            Buy with half the money, same as (money//cur_bid)//2 with one division. Returns 0 when the
+            bid isn't positive or either value isn't finite, like BatchMarketMaker, so a NaN market
+            ends up as a NaN profit instead of an exception.
+            """
+            if not (math.isfinite(money) and math.isfinite(cur_bid)) or cur_bid <= 0:
+                return 0
+            return int(money // (2 * cur_bid))
+
+        def _limit_order(self, from_time: int, to_time: int) -> OrderType:
+            """
+            Like OrderType.new_limit_order, but reuses self._order
+            """
+            self._order.from_time = from_time
+            self._order.to_time = to_time
+            return self._order
       
         def simulate(self):    
-            price_history = (np.array(self.prev_bid_history[-self.window:]) + np.array(self.prev_ask_history[-self.window:])) / 2
-            diffs = np.diff(np.log(price_history[-self.window:]))
+            if self.filled < self.window:
+                """
+                The ring hasn't wrapped yet, so the data is in order in the first self.filled slots
+                """
+                price_history = (self.bid_ring[:self.filled] + self.ask_ring[:self.filled]) / 2
+                return price_history[-1], np.std(price_history)
 
-            if len(self.prev_bid_history) < self.window:
-                avg_orig_price = (self.prev_bid_history[-1] + self.prev_ask_history[-1])/2
-                return avg_orig_price, np.std(price_history)
-            
-            std = np.std(diffs) ** 2
-            drift = np.mean(diffs) + std ** 2 / 2
+            log_prices = np.concatenate((self.log_mid_ring[self.head:], self.log_mid_ring[:self.head]))
+            z = self._rng.standard_normal((self.simulations, self.sim_horizon))
+            return simulate_gbm(log_prices, z)
+
+
+@njit(cache=True)
+def _diff_mean_var(x: np.ndarray) -> Tuple[float, float]:
+    """
+    Mean and (population) variance of np.diff(x) in a single Welford pass, without allocating the diffs
+    """
+    n = 0
+    mean = 0.0
+    m2 = 0.0
+    for i in range(1, len(x)):
+        v = x[i] - x[i - 1]
+        n += 1
+        d = v - mean
+        mean += d / n
+        m2 += d * (v - mean)
+    return mean, m2 / n
+
+@njit(cache=True)
+def _simulate_gbm(log_prices: np.ndarray, z: np.ndarray) -> Tuple[float, float]:
+    """
+    Monte Carlo GBM rollout used by SimpleMarketMaker.simulate, compiled with numba so it doesn't pay
+    interpreter overhead on such tiny arrays. cache=True keeps the compiled code on disk so only the
+    very first run pays for compilation.
+
+    :param log_prices: the log mid prices to fit the drift and volatility on, oldest first
+    :param z: standard normal draws of shape (simulations, horizon), scaled into log returns here
+
+    :return: the mean and the standard deviation of the simulated prices at the end of the horizon
+    """
+    mean, var = _diff_mean_var(log_prices)
+    drift = mean + var / 2
+    std = np.sqrt(var)
+
+    log_returns = drift + std * z
+    future_prices = np.exp(log_prices[-1] + log_returns.sum(axis=1))
+    return np.mean(future_prices), np.std(future_prices)
+
+# The ahead-of-time compiled kernel from build_mm_ext.py needs no warm-up, but it is a snapshot of the
+# code above at build time, so it's only used when asked for with MM_NATIVE=1
+if os.environ.get("MM_NATIVE") == "1":
+    from mm_native import simulate_gbm
+else:
+    simulate_gbm = _simulate_gbm
+
+class BatchMarketMaker:
+    """
+    Vectorized version of SimpleMarketMaker that quotes for N independent trajectories at once.
+    Every piece of per-trajectory state is a shape-(N,) array, so one call to batch_update advances
+    all trajectories with ndarray-wide ops instead of N Python-level update calls.
+
+    Only limit orders valid from timestamp to timestamp + 1 are produced, which is what
+    BatchSimulation expects.
+    """
+    def __init__(self, N: int):
+        self.N = N
+        self.started = False
+
+        """
+        Stats for our previous bid/asks orders, one entry per trajectory
+        """
+        self.prev_mm_bid_price = np.zeros(N, dtype=np.float64)
+        self.prev_mm_ask_price = np.zeros(N, dtype=np.float64)
+        self.prev_mm_bid_amt = np.zeros(N, dtype=np.int64)
+        self.prev_mm_ask_amt = np.zeros(N, dtype=np.int64)
+        self.prev_holding = np.zeros(N, dtype=np.int64)
+        self.prev_money = np.zeros(N, dtype=np.float64)
+
+        self.spread_pct = np.full(N, 0.5, dtype=np.float64)
+
+    def batch_update(self, bid: np.ndarray, ask: np.ndarray, hold: np.ndarray, money: np.ndarray,
+                     t: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Same strategy as SimpleMarketMaker.update, with the Python branches replaced by np.where.
+
+        :param bid: the previous market bid prices, shape (N,)
+        :param ask: the previous market ask prices, shape (N,)
+        :param hold: the number of stocks held by each trajectory, shape (N,)
+        :param money: the money held by each trajectory, shape (N,)
+        :param t: the timestamp of the current (not previous) interval
+
+        :return: a tuple of shape-(N,) arrays containing the new bid price limits, the volumes to buy,
+        the new ask price limits and the volumes to sell
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if not self.started:
+                """
+                no prev amt history, use the naive split spread strategy
+                """
+                p_diff = ask - bid
+                cur_bid = bid + p_diff / 4
+                cur_ask = ask - p_diff / 4
+                ask_vol = np.zeros(self.N, dtype=np.int64)
+                self.started = True
+            else:
+                diff_money = money - self.prev_money
+                diff_hold = hold - self.prev_holding
+                spread = ask - bid
+
+                bid_filled = (diff_money - self.prev_mm_ask_price * diff_hold) / spread
+                ask_filled = (diff_money - self.prev_mm_bid_price * diff_hold) / spread
+
+                """
+                Same caps as the scalar strategy; a ratio that can't be computed (nothing quoted
+                last round) counts as not filled
+                """
+                ratio = (bid_filled / self.prev_mm_bid_amt + ask_filled / self.prev_mm_ask_amt) / 2
+                delta = SimpleMarketMaker._SPREAD_STEP * (1 - 2 * (ratio > SimpleMarketMaker._FILL_TARGET))
+                self.spread_pct = np.clip(self.spread_pct + delta,
+                                          SimpleMarketMaker._SPREAD_LO, SimpleMarketMaker._SPREAD_HI)
+
+                diff_p = spread * self.spread_pct
+                midpoint = (ask + bid) / 2
+
+                cur_bid = midpoint - diff_p
+                cur_ask = midpoint + diff_p
+                ask_vol = hold // 2
 
-            future_prices = []
-            for _ in range(self.simulations): 
-                future_prices.append(price_history[-1] * np.exp(np.sum(np.random.normal(drift, std, self.sim_horizon))))
+            bid_vol = np.where(cur_bid > 0, money // (2 * cur_bid), 0).astype(np.int64)
 
-            future_prices = np.array(future_prices)
+        self.prev_money = money.copy()
+        self.prev_holding = hold.copy()
+        self.prev_mm_bid_price = cur_bid
+        self.prev_mm_ask_price = cur_ask
+        self.prev_mm_bid_amt = bid_vol
+        self.prev_mm_ask_amt = ask_vol
 
-            return np.mean(future_prices), np.std(future_prices)
\ No newline at end of file
+        return cur_bid, bid_vol, cur_ask, ask_vol
@@ -1,4 +1,4 @@
-from maker import SimpleMarketMaker as MarketMaker, OrderType
+from maker import SimpleMarketMaker as MarketMaker, BatchMarketMaker, OrderType
 from mm_game import MarketData
 from typing import Tuple
 from logger import Logger
@@ -81,6 +81,7 @@ class Simulation():
         return self.holding * (self.mmSell[-1]) + self.money - self.get_original_money()
     
     def reset(self):
+        self.logger.close()
         self.start_time = datetime.now()
         log_filename = f"log/{self.start_time.strftime('%Y%m%d_%H%M%S')}.log"
         self.logger = Logger(log_filename)
@@ -109,7 +110,8 @@ class Simulation():
         :param logging: whether to log the execution of limit orders
         """
         profit = 0.0
-        for order in self.limit_order_queue:
+        # Loop over a copy, removing from the list being iterated would skip the order after each removal
+        for order in list(self.limit_order_queue):
             price = order[0]
             volume = order[1]
             buy_sell = order[2]
@@ -273,3 +275,105 @@ class Simulation():
             self.logger.spacing()
 
         self.reset()
+
+
+class BatchSimulation():
+    """
+    Runs N independent copies of the market maker game at once. Trajectory j is column j of the
+    bid_prices, ask_prices, holdings and money arrays, and every step advances all columns together.
+
+    Each trajectory keeps its own MarketData, since the price generator only works on scalars. Limit
+    orders are assumed to be valid from timestamp to timestamp + 1 (see BatchMarketMaker), so at most
+    the orders placed in the last two intervals are alive at any time. They are checked in the same
+    order and with the same rules as Simulation.executeLimitOrders, so on the same market both give
+    the same results.
+    """
+    def __init__(self, maker: BatchMarketMaker):
+        self.market_maker = maker
+        self.N = maker.N
+        self.markets = [MarketData(INIT_BUY, INIT_SELL) for _ in range(self.N)]
+        self.bid_prices = np.full(self.N, INIT_BUY, dtype=np.float64)
+        self.ask_prices = np.full(self.N, INIT_SELL, dtype=np.float64)
+        self.holdings = np.zeros(self.N, dtype=np.int64)
+        self.money = np.full(self.N, START_MONEY, dtype=np.float64)
+        # format: [slot, trajectory], slot 0 holds the orders from the previous interval
+        self.buy_orders = np.zeros((2, self.N), dtype=np.float64)
+        self.buy_volumes = np.zeros((2, self.N), dtype=np.int64)
+        self.sell_orders = np.zeros((2, self.N), dtype=np.float64)
+        self.sell_volumes = np.zeros((2, self.N), dtype=np.int64)
+        self.mode = "normal"
+
+    def checkAndUpdate(self, prevBuy, prevSell, timestamp) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Batched version of Simulation.checkAndUpdate, applying the same volume guards to every trajectory.
+        """
+        buy, vb, sell, vs = self.market_maker.batch_update(prevBuy, prevSell, self.holdings, self.money, timestamp)
+        vb = np.where((buy < 0) | (vb < 0), 0, vb)
+        vs = np.where((sell < 0) | (vs < 0), 0, vs)
+        vs = np.minimum(vs, self.holdings)
+        return buy, vb, sell, vs
+
+    def get_original_money(self):
+        if(self.mode == "fast"):
+            return FAST_START_MONEY
+        return START_MONEY
+
+    def get_final_profit(self) -> np.ndarray:
+        return self.holdings * self.ask_prices + self.money - self.get_original_money()
+
+    def addLimitOrders(self, buy, vb, sell, vs):
+        """
+        Expire the orders from the previous interval and queue the new ones
+        """
+        for book in (self.buy_orders, self.buy_volumes, self.sell_orders, self.sell_volumes):
+            book[0] = book[1]
+        self.buy_orders[1] = buy
+        self.buy_volumes[1] = vb
+        self.sell_orders[1] = sell
+        self.sell_volumes[1] = vs
+
+    def executeLimitOrders(self, market_sell, market_buy):
+        """
+        Batched version of Simulation.executeLimitOrders. Orders are checked oldest first, and a filled
+        order is removed from the book by zeroing its volume.
+
+        :param market_sell: the current market sell prices
+        :param market_buy: the current market buy prices
+        """
+        for slot in range(2):
+            volume = self.buy_volumes[slot]
+            fill = (volume > 0) & (self.buy_orders[slot] <= market_sell) & (market_sell > 0) & (self.money >= 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                max_buyable_volume = np.where(market_sell > 0, np.floor(self.money / market_sell), 0).astype(np.int64)
+            volume = np.where(fill, np.minimum(volume, max_buyable_volume), 0)
+            self.money -= market_sell * volume
+            self.holdings += volume
+            self.buy_volumes[slot] = np.where(fill, 0, self.buy_volumes[slot])
+
+            volume = self.sell_volumes[slot]
+            fill = (volume > 0) & (self.sell_orders[slot] >= market_buy) & (self.holdings >= 0)
+            volume = np.where(fill, np.minimum(volume, self.holdings), 0)
+            self.money += market_buy * volume
+            self.holdings -= volume
+            self.sell_volumes[slot] = np.where(fill, 0, self.sell_volumes[slot])
+
+    def run(self, fast = False):
+        """
+        Runs all N market simulations for a predefined number of intervals.
+        """
+        interval = INTERVAL
+
+        if(fast):
+            self.money[:] = FAST_START_MONEY
+            interval = FAST_INTERVAL
+            self.mode = "fast"
+
+        for i in range(interval):
+            mb, vb, mS, vs = self.checkAndUpdate(self.bid_prices, self.ask_prices, i)
+
+            quotes = zip(self.markets, mb.tolist(), vb.tolist(), mS.tolist(), vs.tolist())
+            for j, (market, b, b_vol, s, s_vol) in enumerate(quotes):
+                self.bid_prices[j], self.ask_prices[j] = market.getNextPrices(b, b_vol, s, s_vol)
+
+            self.addLimitOrders(mb, vb, mS, vs)
+            self.executeLimitOrders(self.ask_prices, self.bid_prices)